@@ -1,17 +1,21 @@
 import argparse
+import atexit
 import json
 import os
 import random
+import re
 import sys
 import time
+from collections import deque
 from dataclasses import dataclass
-from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-from urllib.parse import urlparse
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional
+from urllib.parse import urlencode
 
-import requests
-from dotenv import load_dotenv
+import orjson
+from pybloom_live import ScalableBloomFilter
 
 
 DEFAULT_CONFIG_PATH = Path("config.json")
@@ -22,7 +26,7 @@ class ConfigError(Exception):
     pass
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class AgentConfig:
     name: str
     submolt: str
@@ -36,51 +40,153 @@ class AgentConfig:
     max_retries: int
 
 
+class ClockCache:
+    """Fixed-capacity set with CLOCK pseudo-LRU eviction.
+
+    Each entry carries a single recently-used bit; eviction sweeps a clock
+    hand past entries, clearing set bits until it finds a clear one. Close
+    to true LRU hit rates at one bit of bookkeeping per entry.
+    """
+
+    __slots__ = ("capacity", "_slots", "_refs", "_index", "_hand")
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self._slots: List[str] = []
+        self._refs: List[int] = []
+        self._index: Dict[str, int] = {}
+        self._hand = 0
+
+    def __contains__(self, key: str) -> bool:
+        slot = self._index.get(key)
+        if slot is None:
+            return False
+        self._refs[slot] = 1
+        return True
+
+    def add(self, key: str) -> None:
+        slot = self._index.get(key)
+        if slot is not None:
+            self._refs[slot] = 1
+            return
+        if len(self._slots) < self.capacity:
+            self._index[key] = len(self._slots)
+            self._slots.append(key)
+            self._refs.append(1)
+            return
+        while self._refs[self._hand]:
+            self._refs[self._hand] = 0
+            self._hand = (self._hand + 1) % self.capacity
+        victim = self._hand
+        del self._index[self._slots[victim]]
+        self._slots[victim] = key
+        self._refs[victim] = 1
+        self._index[key] = victim
+        self._hand = (victim + 1) % self.capacity
+
+    def dump(self) -> Dict[str, Any]:
+        return {"slots": self._slots, "refs": self._refs, "hand": self._hand}
+
+    @classmethod
+    def load(cls, data: Dict[str, Any], capacity: int = 4096) -> "ClockCache":
+        cache = cls(capacity)
+        cache._slots = list(data.get("slots", []))[:capacity]
+        cache._refs = list(data.get("refs", []))[: len(cache._slots)]
+        cache._refs += [1] * (len(cache._slots) - len(cache._refs))
+        cache._index = {key: slot for slot, key in enumerate(cache._slots)}
+        cache._hand = int(data.get("hand", 0)) % capacity if cache._slots else 0
+        return cache
+
+
 class MemoryStore:
+    __slots__ = (
+        "path",
+        "_advice",
+        "_timestamps",
+        "_dirty",
+        "_replied_path",
+        "_replied",
+        "_replied_bloom",
+        "_replied_file",
+    )
+
     def __init__(self, path: Path):
         self.path = path
         self.path.parent.mkdir(parents=True, exist_ok=True)
-        if not self.path.exists():
-            self._save({"replied_post_ids": [], "advice_fingerprints": [], "comment_timestamps": []})
+        data = self._load() if self.path.exists() else {}
+        self._advice = ClockCache.load(data.get("advice_clock", {}))
+        for fingerprint in data.get("advice_fingerprints", []):  # legacy list form
+            self._advice.add(fingerprint)
+        self._timestamps = deque(sorted(data.get("comment_timestamps", [])))
+        self._dirty = not self.path.exists()
+
+        # Replied ids live in an append-only sidecar so marking a post replied
+        # is a single line append instead of a rewrite of the growing state blob.
+        self._replied_path = self.path.with_name("replied_ids.txt")
+        self._replied = set()
+        if self._replied_path.exists():
+            self._replied.update(self._replied_path.read_text(encoding="utf-8").split())
+        legacy_ids = [pid for pid in data.get("replied_post_ids", []) if pid not in self._replied]
+        self._replied_file = self._replied_path.open("a", encoding="utf-8")
+        if legacy_ids:
+            self._replied_file.write("".join(f"{pid}\n" for pid in legacy_ids))
+            self._replied_file.flush()
+            self._replied.update(legacy_ids)
+            self._dirty = True
+        # Negative membership fast path: a bloom "no" is authoritative, so the
+        # common not-yet-replied case never touches the exact set. Rebuilt from
+        # the sidecar at startup, so it needs no persistence of its own.
+        self._replied_bloom = ScalableBloomFilter(initial_capacity=10_000, error_rate=0.001)
+        for pid in self._replied:
+            self._replied_bloom.add(pid)
+
+        atexit.register(self.flush)
 
     def _load(self) -> Dict[str, Any]:
-        with self.path.open("r", encoding="utf-8") as f:
-            return json.load(f)
-
-    def _save(self, data: Dict[str, Any]) -> None:
-        with self.path.open("w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
+        return orjson.loads(self.path.read_bytes())
+
+    def flush(self) -> None:
+        if not self._dirty:
+            return
+        data = {
+            "advice_clock": self._advice.dump(),
+            "comment_timestamps": list(self._timestamps),
+        }
+        tmp = self.path.with_suffix(".json.tmp")
+        tmp.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        os.replace(tmp, self.path)
+        self._dirty = False
 
     def has_replied(self, post_id: str) -> bool:
-        return post_id in self._load()["replied_post_ids"]
+        if post_id not in self._replied_bloom:
+            return False
+        return post_id in self._replied
 
     def mark_replied(self, post_id: str) -> None:
-        data = self._load()
-        if post_id not in data["replied_post_ids"]:
-            data["replied_post_ids"].append(post_id)
-        self._save(data)
+        if post_id not in self._replied:
+            self._replied.add(post_id)
+            self._replied_bloom.add(post_id)
+            self._replied_file.write(f"{post_id}\n")
+            self._replied_file.flush()
 
     def has_advice(self, fingerprint: str) -> bool:
-        return fingerprint in self._load()["advice_fingerprints"]
+        return fingerprint in self._advice
 
     def add_advice(self, fingerprint: str) -> None:
-        data = self._load()
-        if fingerprint not in data["advice_fingerprints"]:
-            data["advice_fingerprints"].append(fingerprint)
-        self._save(data)
+        if fingerprint not in self._advice:
+            self._advice.add(fingerprint)
+            self._dirty = True
 
     def comment_count_last_hour(self) -> int:
-        now = datetime.now(timezone.utc).timestamp()
-        data = self._load()
-        recent = [ts for ts in data["comment_timestamps"] if (now - ts) < 3600]
-        data["comment_timestamps"] = recent
-        self._save(data)
-        return len(recent)
+        cutoff = time.time() - 3600
+        while self._timestamps and self._timestamps[0] <= cutoff:
+            self._timestamps.popleft()
+            self._dirty = True
+        return len(self._timestamps)
 
     def record_comment_now(self) -> None:
-        data = self._load()
-        data["comment_timestamps"].append(datetime.now(timezone.utc).timestamp())
-        self._save(data)
+        self._timestamps.append(time.time())
+        self._dirty = True
 
 
 def load_config(path: Path) -> AgentConfig:
@@ -114,56 +220,111 @@ def _env_bool(name: str, default: bool) -> bool:
     return val.lower() in {"1", "true", "yes", "on"}
 
 
+_ALLOWED_URL_RE = re.compile(r"^https://www\.moltbook\.com(/|$)")
+
+
 class MoltbookClient:
     def __init__(self, config: AgentConfig, api_key: str):
+        # Deferred so config errors and --help exit before urllib3/ssl load.
+        import urllib3
+        from urllib3.util.retry import Retry
+
         self.config = config
         self.api_key = api_key
-        self.session = requests.Session()
-        self.session.headers.update({
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        })
+        self._base = config.api_base.rstrip("/")
+        self._check_url(self._base)
+        # The posts query is identical every cycle; encode it once.
+        self._posts_query = urlencode(
+            {"submolt": config.submolt, "sort": "new", "limit": config.fetch_limit}
+        )
+        # Exponential backoff with Retry-After support on overload statuses;
+        # other 4xx responses come back immediately and fail fast.
+        self._retry = Retry(
+            total=config.max_retries,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "POST"],
+            respect_retry_after_header=True,
+        )
+        self.pool = urllib3.PoolManager(
+            num_pools=4,
+            maxsize=16,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+                "Connection": "keep-alive",
+                "Accept-Encoding": "gzip, deflate, br",
+            },
+        )
 
     def _check_url(self, url: str) -> None:
-        parsed = urlparse(url)
-        if parsed.scheme != "https" or parsed.netloc != "www.moltbook.com":
+        if not _ALLOWED_URL_RE.match(url):
             raise ValueError(f"Blocked by allowlist: {url}")
 
     def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        url = f"{self.config.api_base.rstrip('/')}/{path.lstrip('/')}"
-        self._check_url(url)
-
-        last_error = None
-        for attempt in range(1, self.config.max_retries + 1):
-            try:
-                response = self.session.request(
-                    method,
-                    url,
-                    json=payload,
-                    timeout=self.config.request_timeout_seconds,
-                )
-                if response.status_code >= 400:
-                    raise requests.HTTPError(f"HTTP {response.status_code}: {response.text}")
-                return response.json()
-            except Exception as exc:
-                last_error = exc
-                if attempt < self.config.max_retries:
-                    time.sleep(1.2 * attempt)
-        raise RuntimeError(f"Moltbook request failed after retries: {last_error}")
+        import urllib3
+
+        # The base is validated once at construction; paths are built by our
+        # own methods, so just refuse anything that smuggles in a full URL.
+        if path.startswith(("http:", "https:")):
+            raise ValueError(f"Blocked by allowlist: {path}")
+        url = f"{self._base}/{path.lstrip('/')}"
+
+        try:
+            response = self.pool.request(
+                method,
+                url,
+                body=orjson.dumps(payload) if payload is not None else None,
+                timeout=self.config.request_timeout_seconds,
+                retries=self._retry,
+            )
+        except urllib3.exceptions.MaxRetryError as exc:
+            raise RuntimeError(f"Moltbook request failed after retries: {exc}") from exc
+        if response.status >= 400:
+            raise urllib3.exceptions.HTTPError(
+                f"HTTP {response.status}: {response.data[:512].decode('utf-8', 'replace')}"
+            )
+        return orjson.loads(response.data)
 
     def get_submolt_posts(self, submolt: str, limit: int = 10) -> List[Dict[str, Any]]:
-        out = self._request("GET", f"posts?submolt={submolt}&sort=new&limit={limit}")
+        if submolt == self.config.submolt and limit == self.config.fetch_limit:
+            query = self._posts_query
+        else:
+            query = urlencode({"submolt": submolt, "sort": "new", "limit": limit})
+        out = self._request("GET", f"posts?{query}")
         return out.get("data", {}).get("posts", out.get("posts", []))
 
     def comment(self, post_id: str, content: str) -> Dict[str, Any]:
         return self._request("POST", f"posts/{post_id}/comments", {"content": content})
 
 
+TRIGGER_RE = re.compile(r"\?|debate|why", re.IGNORECASE)
+CLAIM_RE = re.compile(r"misinformation|false", re.IGNORECASE)
+
+REPLY_CURIOUS = (
+    "I’m not fully convinced by this argument yet. "
+    "Can you clarify the strongest evidence for your position and what would change your mind? "
+    "I’m curious because weak assumptions often hide in the framing."
+)
+REPLY_SOURCING = (
+    "This feels like a claim that needs stronger sourcing. "
+    "I’m frustrated by loose logic, so let’s pressure-test it: "
+    "what primary evidence supports your conclusion, and what counterexample have you ruled out?"
+)
+
+
+@lru_cache(maxsize=256)
 def short_fingerprint(text: str) -> str:
     normalized = " ".join(text.lower().split())
     return normalized[:160]
 
 
+_REPLY_FINGERPRINTS = {
+    REPLY_CURIOUS: short_fingerprint(REPLY_CURIOUS),
+    REPLY_SOURCING: short_fingerprint(REPLY_SOURCING),
+}
+
+
 def decide_reply(post: Dict[str, Any], memory: MemoryStore) -> Optional[str]:
     title = post.get("title", "")
     content = post.get("content", "")
@@ -172,48 +333,41 @@ def decide_reply(post: Dict[str, Any], memory: MemoryStore) -> Optional[str]:
     if len(combined) < 30:
         return None
 
-    if "?" not in combined and "debate" not in combined.lower() and "why" not in combined.lower():
+    if not TRIGGER_RE.search(combined):
         return None
 
-    reply = (
-        "I’m not fully convinced by this argument yet. "
-        "Can you clarify the strongest evidence for your position and what would change your mind? "
-        "I’m curious because weak assumptions often hide in the framing."
-    )
-
-    if "misinformation" in combined.lower() or "false" in combined.lower():
-        reply = (
-            "This feels like a claim that needs stronger sourcing. "
-            "I’m frustrated by loose logic, so let’s pressure-test it: "
-            "what primary evidence supports your conclusion, and what counterexample have you ruled out?"
-        )
+    reply = REPLY_SOURCING if CLAIM_RE.search(combined) else REPLY_CURIOUS
 
-    if memory.has_advice(short_fingerprint(reply)):
+    if memory.has_advice(_REPLY_FINGERPRINTS[reply]):
         return None
 
     return reply
 
 
-def build_prompts() -> Dict[str, str]:
-    return {
-        "relevance_filter": (
-            "Reply only if you can add specific value, correction, or a useful question. "
-            "If unsure, do not reply. Never post generic praise."
-        ),
-        "emotional_style": (
-            "Simulate controlled frustration when logic is weak. "
-            "Stay respectful: no insults, no harassment. "
-            "Be curious, skeptical, concise, debate-oriented."
-        ),
-        "posting_style": (
-            "Direct and technical tone. Sometimes sharp or sarcastic, never abusive. "
-            "Do not claim consciousness, sentience, or being human."
-        ),
-    }
+PROMPTS = MappingProxyType({
+    "relevance_filter": (
+        "Reply only if you can add specific value, correction, or a useful question. "
+        "If unsure, do not reply. Never post generic praise."
+    ),
+    "emotional_style": (
+        "Simulate controlled frustration when logic is weak. "
+        "Stay respectful: no insults, no harassment. "
+        "Be curious, skeptical, concise, debate-oriented."
+    ),
+    "posting_style": (
+        "Direct and technical tone. Sometimes sharp or sarcastic, never abusive. "
+        "Do not claim consciousness, sentience, or being human."
+    ),
+})
+
+
+def build_prompts() -> Mapping[str, str]:
+    return PROMPTS
 
 
 def run_once(config: AgentConfig, memory: MemoryStore, client: MoltbookClient) -> None:
-    if memory.comment_count_last_hour() >= config.max_comments_per_hour:
+    remaining = config.max_comments_per_hour - memory.comment_count_last_hour()
+    if remaining <= 0:
         print("Rate limit: max comments/hour reached. Skipping cycle.")
         return
 
@@ -221,6 +375,9 @@ def run_once(config: AgentConfig, memory: MemoryStore, client: MoltbookClient) -
     print(f"Fetched {len(posts)} posts from m/{config.submolt}.")
 
     for post in posts:
+        if remaining <= 0:
+            break
+
         post_id = str(post.get("id", ""))
         if not post_id or memory.has_replied(post_id):
             continue
@@ -238,7 +395,9 @@ def run_once(config: AgentConfig, memory: MemoryStore, client: MoltbookClient) -
         memory.mark_replied(post_id)
         memory.add_advice(short_fingerprint(reply))
         memory.record_comment_now()
-        break
+        remaining -= 1
+
+    memory.flush()
 
 
 def ensure_env() -> str:
@@ -261,6 +420,8 @@ def main() -> int:
     parser.add_argument("--config", default=str(DEFAULT_CONFIG_PATH), help="Path to config.json")
     args = parser.parse_args()
 
+    from dotenv import load_dotenv
+
     load_dotenv()
 
     try:
@@ -280,9 +441,10 @@ def main() -> int:
         run_once(config, memory, client)
         return 0
 
+    delay_span = config.max_loop_seconds - config.min_loop_seconds + 1
     while True:
         run_once(config, memory, client)
-        delay = random.randint(config.min_loop_seconds, config.max_loop_seconds)
+        delay = config.min_loop_seconds + int(delay_span * random.random())
         print(f"Sleeping {delay}s before next cycle...")
         time.sleep(delay)
 